@@ -0,0 +1,36 @@
+import os
+
+import uvicorn
+from loguru import logger
+
+if __name__ == "__main__":
+    # Load .env once here: workers inherit the environment along with
+    # APP_ENV_LOADED and skip their own parse in src.server.api.
+    if not os.getenv("APP_ENV_LOADED"):
+        from dotenv import load_dotenv
+        load_dotenv()
+        os.environ["APP_ENV_LOADED"] = "1"
+
+    # One worker by default. Each worker opens its own ./chroma_db PersistentClient,
+    # which Chroma does not support across processes, and keeps worker-local state
+    # (the similar() query cache, FlatMemory's loaded matrix, the indexer's
+    # _LAST_INDEXED) that another worker's /memory/* writes never invalidate.
+    # WEB_CONCURRENCY > 1 is an explicit opt-in for read-mostly deployments that
+    # accept those stale reads, or whose memory writes go through a single worker.
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        logger.warning(
+            f"Starting {workers} workers: memory stores and caches are per worker, "
+            "so /memory/* updates only reach the worker that handled them."
+        )
+
+    # With an import string, every worker process imports the app itself, so the
+    # Chroma client, Notion client and browser pools are all created per worker.
+    uvicorn.run(
+        "src.server.api:app",
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        loop="auto",  # uvloop when installed
+        http="auto",  # httptools when installed
+    )
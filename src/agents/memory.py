@@ -1,18 +1,102 @@
+from collections import OrderedDict
+from pathlib import Path
 from typing import Any, Dict, List, Tuple
+import hashlib
+import threading
+import time
 import chromadb
+import numpy as np
+import orjson
+from chromadb.utils import embedding_functions
+
+# --- Query embedding cache ---
+# Same model the collections use by default (all-MiniLM-L6-v2 via ONNX), so
+# vectors computed here are interchangeable with the ones Chroma stores.
+_EMBEDDER = embedding_functions.DefaultEmbeddingFunction()
+_EMB_CACHE_SIZE = 1024
+_EMB_CACHE: "OrderedDict[bytes, Any]" = OrderedDict()
+_EMB_LOCK = threading.Lock()
+
+def _query_digest(query: str) -> bytes:
+    # Cache keys hold a 16-byte digest, not the (possibly multi-KB) job description itself.
+    return hashlib.blake2b(query.encode("utf-8"), digest_size=16).digest()
+
+def embed_query(query: str) -> Any:
+    """Embeds a query once and reuses the vector for identical text."""
+    key = _query_digest(query)
+    with _EMB_LOCK:
+        vec = _EMB_CACHE.get(key)
+        if vec is not None:
+            _EMB_CACHE.move_to_end(key)
+            return vec
+
+    vec = _EMBEDDER([query])[0]
+
+    with _EMB_LOCK:
+        _EMB_CACHE[key] = vec
+        while len(_EMB_CACHE) > _EMB_CACHE_SIZE:
+            _EMB_CACHE.popitem(last=False)
+    return vec
+
+def _quantize(vecs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization: vecs[i] ~= q[i] * scales[i]."""
+    scales = np.abs(vecs).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.round(vecs / scales[:, None]).astype(np.int8)
+    return q, scales.astype(np.float32)
 
 class Memory:
     """
     Light wrapper around ChromaDB for semantic memory.
     This version uses a persistent client to save data to disk.
+
+    Results of `similar()` are kept in a small process-wide LRU cache with a TTL,
+    so repeated queries skip the embedding + ANN search. Any write clears it.
     """
-    _client = chromadb.PersistentClient(path="./chroma_db")
+    # Opened on first use, so each server worker process gets its own SQLite handle
+    _client: Any = None
+    # One handle per collection name for the whole process
+    _collections: Dict[str, Any] = {}
+    _collections_lock = threading.Lock()
+
+    QUERY_CACHE_SIZE = 512
+    QUERY_CACHE_TTL = 300.0  # seconds
+    _query_cache: "OrderedDict[tuple, Tuple[float, List[Tuple[str, Dict[str, Any]]]]]" = OrderedDict()
+    _cache_lock = threading.RLock()
 
     def __init__(self, collection: str = "profile") -> None:
-        self.col = self._client.get_or_create_collection(collection)
+        with self._collections_lock:
+            col = self._collections.get(collection)
+            if col is None:
+                if Memory._client is None:
+                    Memory._client = chromadb.PersistentClient(path="./chroma_db")
+                col = Memory._client.get_or_create_collection(collection)
+                self._collections[collection] = col
+        self.col = col
+
+    @classmethod
+    def clear_query_cache(cls) -> None:
+        with cls._cache_lock:
+            cls._query_cache.clear()
 
     def upsert(self, doc_id: str, text: str, metadata: Dict[str, Any] | None = None) -> None:
         self.col.upsert(ids=[doc_id], documents=[text], metadatas=[metadata or {}])
+        self.clear_query_cache()
+
+    def upsert_many(self, doc_ids: List[str], texts: List[str]) -> None:
+        self.col.upsert(ids=doc_ids, documents=texts)
+        self.clear_query_cache()
+
+    def delete_many(self, doc_ids: List[str]) -> None:
+        if doc_ids:
+            self.col.delete(ids=doc_ids)
+            self.clear_query_cache()
+
+    def count(self) -> int:
+        return self.col.count()
+
+    def all_ids(self) -> List[str]:
+        return self.col.get(include=[])["ids"]
 
     def get(self, doc_id: str) -> str | None:
         res = self.col.get(ids=[doc_id])
@@ -26,8 +110,132 @@ class Memory:
         self.upsert("resume_fingerprint", fingerprint, {"type": "fingerprint"})
 
     def similar(self, query: str, k: int = 4) -> List[Tuple[str, Dict[str, Any]]]:
-        res = self.col.query(query_texts=[query], n_results=k)
-        docs = res.get("documents", [[]])[0]
-        metas = res.get("metadatas", [[]])[0]
-        return list(zip(docs, metas))
+        key = (self.col.name, _query_digest(query), k)
+        now = time.monotonic()
+        with self._cache_lock:
+            hit = self._query_cache.get(key)
+            if hit is not None and hit[0] > now:
+                self._query_cache.move_to_end(key)
+                return list(hit[1])
+
+        res = self.col.query(query_embeddings=[embed_query(query)], n_results=k)
+        # Chroma always returns one [n_results] list per query embedding
+        results = list(zip(res["documents"][0], res["metadatas"][0]))
+
+        with self._cache_lock:
+            self._query_cache[key] = (now + self.QUERY_CACHE_TTL, results)
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > self.QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return list(results)
 
+
+class FlatMemory:
+    """
+    In-memory alternative to `Memory` for small, mostly static collections
+    such as the resume chunks (hundreds of vectors, not tens of thousands).
+    Embeddings live in one contiguous int8 matrix with a float32 scale per row
+    (4x smaller than float32), so `similar()` is a single integer matrix-vector
+    product plus a partial sort instead of an HNSW lookup.
+    Persisted as `<collection>.npz` + `<collection>.json` under ./flat_db.
+    """
+    _root = Path("./flat_db")
+
+    def __init__(self, collection: str = "profile") -> None:
+        self.name = collection
+        self._emb_path = self._root / f"{collection}.npz"
+        self._doc_path = self._root / f"{collection}.json"
+        self._lock = threading.RLock()
+
+        if self._doc_path.exists() and self._emb_path.exists():
+            state = orjson.loads(self._doc_path.read_bytes())
+            self.ids: List[str] = state["ids"]
+            self.docs: List[str] = state["docs"]
+            self.metas: List[Dict[str, Any]] = state["metas"]
+            with np.load(self._emb_path) as arrays:
+                self.q_embs, self.scales = arrays["q"], arrays["scales"]
+        else:
+            self.ids, self.docs, self.metas = [], [], []
+            self.q_embs = np.empty((0, 0), dtype=np.int8)
+            self.scales = np.empty(0, dtype=np.float32)
+        self._index = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    def upsert(self, doc_id: str, text: str, metadata: Dict[str, Any] | None = None) -> None:
+        self._upsert([doc_id], [text], [metadata or {}])
+
+    def upsert_many(self, doc_ids: List[str], texts: List[str]) -> None:
+        self._upsert(doc_ids, texts, [{} for _ in doc_ids])
+
+    def _upsert(self, doc_ids: List[str], texts: List[str], metas: List[Dict[str, Any]]) -> None:
+        q_vecs, vec_scales = _quantize(np.asarray(_EMBEDDER(texts), dtype=np.float32))
+        with self._lock:
+            if not self.ids:
+                self.q_embs = np.empty((0, q_vecs.shape[1]), dtype=np.int8)
+            base = len(self.ids)
+            new_rows: List[Tuple[np.ndarray, np.float32]] = []
+            for doc_id, text, meta, vec, scale in zip(doc_ids, texts, metas, q_vecs, vec_scales):
+                i = self._index.get(doc_id)
+                if i is None:
+                    self._index[doc_id] = len(self.ids)
+                    self.ids.append(doc_id)
+                    self.docs.append(text)
+                    self.metas.append(meta)
+                    new_rows.append((vec, scale))
+                    continue
+                self.docs[i], self.metas[i] = text, meta
+                if i >= base:
+                    new_rows[i - base] = (vec, scale)
+                else:
+                    self.q_embs[i], self.scales[i] = vec, scale
+            if new_rows:
+                self.q_embs = np.vstack([self.q_embs, np.stack([row[0] for row in new_rows])])
+                self.scales = np.concatenate([self.scales, np.array([row[1] for row in new_rows], dtype=np.float32)])
+            self._save()
+
+    def _save(self) -> None:
+        self._root.mkdir(parents=True, exist_ok=True)
+        np.savez(self._emb_path, q=self.q_embs, scales=self.scales)
+        self._doc_path.write_bytes(orjson.dumps({"ids": self.ids, "docs": self.docs, "metas": self.metas}))
+
+    def delete_many(self, doc_ids: List[str]) -> None:
+        with self._lock:
+            drop = {self._index[doc_id] for doc_id in doc_ids if doc_id in self._index}
+            if not drop:
+                return
+            keep = [i for i in range(len(self.ids)) if i not in drop]
+            self.ids = [self.ids[i] for i in keep]
+            self.docs = [self.docs[i] for i in keep]
+            self.metas = [self.metas[i] for i in keep]
+            self.q_embs, self.scales = self.q_embs[keep], self.scales[keep]
+            self._index = {doc_id: i for i, doc_id in enumerate(self.ids)}
+            self._save()
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def all_ids(self) -> List[str]:
+        with self._lock:
+            return list(self.ids)
+
+    def get(self, doc_id: str) -> str | None:
+        i = self._index.get(doc_id)
+        return self.docs[i] if i is not None else None
+
+    def get_resume_fingerprint(self) -> str | None:
+        return self.get("resume_fingerprint")
+
+    def set_resume_fingerprint(self, fingerprint: str) -> None:
+        self.upsert("resume_fingerprint", fingerprint, {"type": "fingerprint"})
+
+    def similar(self, query: str, k: int = 4) -> List[Tuple[str, Dict[str, Any]]]:
+        q_vec, q_scale = _quantize(np.asarray(embed_query(query), dtype=np.float32)[None, :])
+        with self._lock:
+            k = min(k, len(self.ids))
+            if k == 0:
+                return []
+            # MiniLM vectors are unit-length, so the inner product ranks like cosine.
+            # int32 accumulation: 384 dims * 127^2 stays far below the int32 limit
+            scores = (self.q_embs.astype(np.int32) @ q_vec[0].astype(np.int32)) * self.scales * q_scale[0]
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.docs[i], self.metas[i]) for i in top]
@@ -0,0 +1,20 @@
+from functools import lru_cache
+import os
+
+from src.agents.memory import FlatMemory, Memory
+from src.llm import LLM
+
+# Process-wide handles. Each Memory(...) resolves a Chroma collection and each
+# LLM() re-reads the environment and reconfigures the client, so pipelines
+# share one of each instead of rebuilding them per call.
+
+@lru_cache(maxsize=16)
+def get_memory(collection: str) -> Memory | FlatMemory:
+    # RESUME_MEMORY_BACKEND=flat keeps the small resume_chunks collection in a NumPy matrix
+    if collection == "resume_chunks" and os.getenv("RESUME_MEMORY_BACKEND", "chroma").lower() == "flat":
+        return FlatMemory(collection)
+    return Memory(collection)
+
+@lru_cache(maxsize=1)
+def get_llm() -> LLM:
+    return LLM()
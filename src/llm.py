@@ -1,6 +1,7 @@
 from __future__ import annotations
 import os
-from typing import Optional
+import re
+from typing import Iterator, Mapping, Optional
 import google.generativeai as genai
 from loguru import logger
 
@@ -14,8 +15,20 @@ def truncate_by_tokens(text: str, max_tokens: int) -> str:
     if estimate_tokens(text) <= max_tokens:
         return text
     char_budget = max_tokens * 4
-    # Ensure we don't cut in the middle of a word for the truncation message
-    return text[:char_budget].rsplit(' ', 1)[0] + "\n…[truncated]"
+    # Ensure we don't cut in the middle of a word for the truncation message.
+    # rfind over the budget window avoids copying the prefix twice.
+    cut = text.rfind(' ', 0, char_budget)
+    return text[:cut if cut != -1 else char_budget] + "\n…[truncated]"
+
+# --- prompt template helpers ---
+_PLACEHOLDER_RE = re.compile(r"\{\{(\w+)\}\}")
+
+def render_template(tmpl: str, values: Mapping[str, str]) -> str:
+    """
+    Fills {{placeholders}} in a single pass over the template.
+    An unknown placeholder raises KeyError instead of leaking into the prompt.
+    """
+    return _PLACEHOLDER_RE.sub(lambda m: values[m.group(1)], tmpl)
 
 # --- minimal LLM adapter ---
 class LLM:
@@ -45,6 +58,12 @@ class LLM:
             
             genai.configure(api_key=self.api_key)
 
+    def _generation_config(self) -> "genai.types.GenerationConfig":
+        return genai.types.GenerationConfig(
+            max_output_tokens=self.max_output_tokens,
+            temperature=self.temperature,
+        )
+
     def generate(self, prompt: str) -> str:
         safe_prompt = truncate_by_tokens(prompt, self.max_prompt_tokens)
 
@@ -62,17 +81,33 @@ class LLM:
             # --- UPDATED: Use the configurable model name ---
             model = genai.GenerativeModel(self.model_name)
             
-            generation_config = genai.types.GenerationConfig(
-                max_output_tokens=self.max_output_tokens,
-                temperature=self.temperature,
-            )
-            
             try:
-                response = model.generate_content(safe_prompt, generation_config=generation_config)
+                response = model.generate_content(safe_prompt, generation_config=self._generation_config())
                 logger.success("Successfully received response from Gemini.")
                 return response.text
             except Exception as e:
                 logger.error(f"Error calling Gemini API: {e}")
                 return f"[ERROR] Failed to generate text from Gemini: {e}"
 
-        raise ValueError(f"Unknown MODEL_BACKEND: {self.backend}")
\ No newline at end of file
+        raise ValueError(f"Unknown MODEL_BACKEND: {self.backend}")
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """
+        Same as `generate`, but yields the text as the backend produces it.
+        Backends without streaming yield the whole response as one chunk.
+        """
+        if self.backend != "gemini":
+            yield self.generate(prompt)
+            return
+
+        safe_prompt = truncate_by_tokens(prompt, self.max_prompt_tokens)
+        logger.info(f"Streaming from Gemini API with model '{self.model_name}'...")
+        model = genai.GenerativeModel(self.model_name)
+
+        try:
+            for chunk in model.generate_content(safe_prompt, generation_config=self._generation_config(), stream=True):
+                yield chunk.text
+            logger.success("Successfully streamed response from Gemini.")
+        except Exception as e:
+            logger.error(f"Error calling Gemini API: {e}")
+            yield f"[ERROR] Failed to generate text from Gemini: {e}"
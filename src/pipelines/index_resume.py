@@ -0,0 +1,139 @@
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import count, islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from loguru import logger
+import xxhash
+
+try:
+    import pymupdf  # the legacy `fitz` alias is deprecated
+except ImportError:  # pragma: no cover - slower pure-Python fallback
+    pymupdf = None
+    from pypdf import PdfReader
+    logger.warning("PyMuPDF is not installed; resume indexing falls back to the much slower pypdf.")
+
+from src.agents.registry import get_memory
+
+# --- Configuration ---
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+# Each upsert embeds its documents synchronously. Batches of 32 keep the ONNX
+# embedder near full throughput while only one small batch of chunks and
+# embeddings is resident at a time.
+BATCH_SIZE = 32
+# Fingerprint read size; keeps the hash working set small regardless of PDF size
+HASH_BLOCK_SIZE = 1 << 20
+
+_CHUNK_ID = "resume_chunk_{}".format
+
+# path -> (st_mtime_ns, st_size) of the file this process last saw indexed.
+# Lets an unchanged-resume call return without touching either memory store.
+_LAST_INDEXED: Dict[str, Tuple[int, int]] = {}
+
+
+def _iter_page_texts(pdf_path: Path) -> Iterator[str]:
+    # MuPDF parses in C; pypdf's per-operator Python dispatch dominated indexing time.
+    # Serial extraction is a few ms per dozen pages, far below any process pool's start-up.
+    if pymupdf is None:
+        for page in PdfReader(pdf_path).pages:
+            yield page.extract_text() or ""
+        return
+
+    with pymupdf.open(pdf_path) as doc:
+        for page in doc:
+            yield page.get_text("text")
+
+
+def _iter_chunks(pages: Iterable[str]) -> Iterator[str]:
+    """
+    Yields overlapping CHUNK_SIZE windows as pages stream in.
+    Only the not-yet-chunked tail is carried over, so the full resume text is never built.
+    """
+    stride = CHUNK_SIZE - CHUNK_OVERLAP
+    buffer = ""
+    emitted = False
+    for page_no, page_text in enumerate(pages):
+        buffer += ("\n" if page_no else "") + page_text
+        while len(buffer) >= CHUNK_SIZE:
+            window = buffer[:CHUNK_SIZE]
+            # Image-only pages extract as bare newlines; they are nothing to retrieve
+            if not window.isspace():
+                yield window
+            buffer = buffer[stride:]
+            emitted = True
+    # After a full window the first CHUNK_OVERLAP chars are already indexed;
+    # a tail no longer than that would be a duplicate fragment.
+    if buffer and not buffer.isspace() and (not emitted or len(buffer) > CHUNK_OVERLAP):
+        yield buffer
+
+
+@lru_cache(maxsize=8)
+def _fingerprint(path: str, mtime_ns: int, size: int) -> str:
+    # mtime/size are part of the cache key only: a changed file misses the cache.
+    h = xxhash.xxh3_64()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            h.update(block)
+    # Tagged with the hash family, so fingerprints saved by an older algorithm never
+    # match and force exactly one re-index.
+    return "xxh3:" + h.hexdigest()
+
+
+def resume_fingerprint(pdf_path: Path) -> str:
+    """Content fingerprint of the resume PDF, recomputed only when the file changes."""
+    st = pdf_path.stat()
+    return _fingerprint(str(pdf_path), st.st_mtime_ns, st.st_size)
+
+
+def run_resume_indexer(pdf_path: Path) -> dict:
+    """
+    The Indexer Agent's main pipeline.
+    Splits the resume PDF into overlapping chunks and stores them in the
+    'resume_chunks' memory. Skips all work when the PDF fingerprint is unchanged.
+    """
+    st = pdf_path.stat()
+    file_key, file_stat = str(pdf_path), (st.st_mtime_ns, st.st_size)
+    if _LAST_INDEXED.get(file_key) == file_stat:
+        return {"ok": True, "message": "Resume memory is already up-to-date."}
+
+    current_fingerprint = _fingerprint(file_key, *file_stat)
+    profile_mem = get_memory("profile")
+    saved_fingerprint = profile_mem.get_resume_fingerprint()
+    resume_mem = get_memory("resume_chunks")
+
+    # The fingerprint lives in 'profile', so also check the chunks store is populated
+    # (it starts empty after switching RESUME_MEMORY_BACKEND).
+    if current_fingerprint == saved_fingerprint and resume_mem.count():
+        _LAST_INDEXED[file_key] = file_stat
+        return {"ok": True, "message": "Resume memory is already up-to-date."}
+
+    logger.info("New resume version detected. Starting indexing process...")
+    # extract -> chunk -> write is one streaming pass; at most one batch is held in memory
+    chunks = _iter_chunks(_iter_page_texts(pdf_path))
+
+    chunk_no = count()
+    n_chunks = 0
+    # One write in flight: the next batch is extracted while the previous one embeds
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="resume-upsert") as writer:
+        pending: Optional[Future] = None
+        while batch := list(islice(chunks, BATCH_SIZE)):
+            doc_ids = list(map(_CHUNK_ID, islice(chunk_no, len(batch))))
+            if pending:
+                pending.result()
+            pending = writer.submit(resume_mem.upsert_many, doc_ids, batch)
+            n_chunks += len(batch)
+        if pending:
+            pending.result()
+    # Upserts only overwrite ids 0..n_chunks-1; drop any left over from a longer previous version
+    current_ids = set(map(_CHUNK_ID, range(n_chunks)))
+    stale_ids = [doc_id for doc_id in resume_mem.all_ids() if doc_id not in current_ids]
+    if stale_ids:
+        resume_mem.delete_many(stale_ids)
+        logger.info(f"Removed {len(stale_ids)} stale chunks from the previous resume version.")
+    profile_mem.set_resume_fingerprint(current_fingerprint)
+    _LAST_INDEXED[file_key] = file_stat
+
+    logger.success(f"Successfully indexed {n_chunks} chunks and saved new fingerprint.")
+    return {"ok": True, "message": f"Successfully indexed new resume with {n_chunks} chunks."}
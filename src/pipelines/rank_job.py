@@ -1,50 +1,51 @@
 from __future__ import annotations
+from functools import lru_cache
 from pathlib import Path
-import json
+import orjson
 from loguru import logger
 
-from src.agents.memory import Memory
-from src.llm import LLM, truncate_by_tokens
+from src.agents.registry import get_llm, get_memory
+from src.llm import render_template, truncate_by_tokens
 
 # --- Configuration ---
 MAX_RESUME_TOKENS = 1500
 MAX_JOBDESC_TOKENS = 1500
 
 # --- NEW: A helper function to clean the AI's output ---
-def _clean_json_response(text: str) -> str:
+def _clean_json_response(text: str) -> bytes:
     """
     Cleans the raw text response from an LLM to extract a valid JSON object.
     It removes markdown code fences and leading/trailing whitespace.
+    Works on the UTF-8 bytes so the result can go straight to orjson.
     """
-    # Find the start of the JSON object
-    json_start_index = text.find('{')
-    # Find the end of the JSON object
-    json_end_index = text.rfind('}')
+    data = text.encode("utf-8")
+    # Find the start and end of the JSON object
+    json_start_index = data.find(b'{')
+    json_end_index = data.rfind(b'}')
     
     if json_start_index != -1 and json_end_index != -1:
-        # Extract the JSON part
-        json_str = text[json_start_index:json_end_index + 1]
-        return json_str
+        return data[json_start_index:json_end_index + 1]
     
     # Fallback if no JSON object is found
-    return text.strip()
+    return data.strip()
 
+@lru_cache(maxsize=1)
 def _load_prompt_template() -> str:
+    # The template only changes on deploy, so read it once per process.
     tmpl_path = Path("src/prompts/tasks/rank_job_fit.md")
     return tmpl_path.read_text(encoding="utf-8")
 
 def _render_prompt(tmpl: str, *, job_title: str, job_desc: str, resume_text: str) -> str:
-    return (
-        tmpl.replace("{{job_title}}", job_title)
-        .replace("{{job_desc}}", job_desc)
-        .replace("{{resume_text}}", resume_text)
-    )
+    return render_template(tmpl, {"job_title": job_title, "job_desc": job_desc, "resume_text": resume_text})
 
 def run_job_ranker(job_title: str, job_desc: str) -> dict:
     logger.info(f"Starting job ranking for: {job_title}")
+
+    # Truncate before retrieval so the query embedding sees the same text as the prompt
+    safe_job_desc = truncate_by_tokens(job_desc, MAX_JOBDESC_TOKENS)
     
-    resume_mem = Memory("resume_chunks")
-    relevant_chunks = resume_mem.similar(query=job_desc, k=4)
+    resume_mem = get_memory("resume_chunks")
+    relevant_chunks = resume_mem.similar(query=safe_job_desc, k=4)
     contextual_resume = "\n---\n".join([chunk[0] for chunk in relevant_chunks])
     
     if not relevant_chunks:
@@ -53,25 +54,24 @@ def run_job_ranker(job_title: str, job_desc: str) -> dict:
         logger.success(f"Found {len(relevant_chunks)} relevant resume chunks.")
 
     safe_resume_text = truncate_by_tokens(contextual_resume, MAX_RESUME_TOKENS)
-    safe_job_desc = truncate_by_tokens(job_desc, MAX_JOBDESC_TOKENS)
 
     prompt_template = _load_prompt_template()
     prompt = _render_prompt(
         tmpl=prompt_template, job_title=job_title, job_desc=safe_job_desc, resume_text=safe_resume_text
     )
 
-    llm = LLM()
+    llm = get_llm()
     response_text = llm.generate(prompt)
     logger.debug(f"LLM Response (raw):\n---\n{response_text}\n---")
     
     # --- UPDATED: Use the cleaner before parsing ---
-    cleaned_text = _clean_json_response(response_text)
+    cleaned_json = _clean_json_response(response_text)
     
     try:
-        result = json.loads(cleaned_text)
+        result = orjson.loads(cleaned_json)
         logger.success("Successfully parsed JSON response from LLM.")
-    except json.JSONDecodeError:
-        logger.error(f"Failed to parse cleaned JSON. Cleaned text was: {cleaned_text}")
+    except orjson.JSONDecodeError:
+        logger.error(f"Failed to parse cleaned JSON. Cleaned text was: {cleaned_json.decode('utf-8', 'replace')}")
         result = {"fit_score": 0.0, "reason": "Error: Failed to get a valid analysis from the AI."}
 
     return result
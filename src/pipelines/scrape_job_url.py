@@ -1,8 +1,21 @@
 from loguru import logger
-from playwright.sync_api import sync_playwright
+from playwright.async_api import Browser as AsyncBrowser, async_playwright
+from playwright.sync_api import Browser, BrowserContext, TimeoutError as PlaywrightTimeoutError, sync_playwright
+import asyncio
+import atexit
+import gc
+import hashlib
+import json
 import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple
 import requests
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 from urllib.parse import urlparse, urlencode
 from apify_client import ApifyClient
 
@@ -21,6 +34,252 @@ SITE_SELECTORS = {
     }
 }
 
+class _SiteSelectors(NamedTuple):
+    job_title: str
+    company: str
+    description_container: str
+
+# Validated once at import: a missing or misspelled key fails here, not mid-scrape
+_SITE_CONFIGS = {site: _SiteSelectors(**sel) for site, sel in SITE_SELECTORS.items()}
+_DEFAULT_SITE = _SITE_CONFIGS["indeed.com"]
+
+@lru_cache(maxsize=256)
+def _hostname(job_url: str) -> str:
+    # Each URL is parsed by both the scraper entry point and the HTML extractor
+    return (urlparse(job_url).hostname or "").lower()
+
+@lru_cache(maxsize=64)
+def _resolve_selectors(hostname: str) -> _SiteSelectors | None:
+    """
+    Finds the selector config for a hostname by walking its parent domains,
+    e.g. 'www.fr.indeed.com' -> 'fr.indeed.com' -> 'indeed.com'.
+    """
+    labels = hostname.split(".")
+    for i in range(len(labels) - 1):
+        selectors = _SITE_CONFIGS.get(".".join(labels[i:]))
+        if selectors:
+            return selectors
+    return None
+
+# --- Result cache ---
+# Postings rarely change within a day, so retries and prompt iterations on the
+# same job are served from disk. Only successful scrapes are stored.
+SCRAPE_CACHE_DIR = Path(".cache/scrape")
+SCRAPE_CACHE_TTL = 24 * 60 * 60  # seconds
+
+def _cache_path(job_url: str) -> Path:
+    return SCRAPE_CACHE_DIR / f"{hashlib.sha256(job_url.encode('utf-8')).hexdigest()}.json"
+
+def _load_cached(job_url: str) -> dict | None:
+    path = _cache_path(job_url)
+    try:
+        if time.time() - path.stat().st_mtime > SCRAPE_CACHE_TTL:
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def _store_cached(job_url: str, result: dict) -> None:
+    try:
+        SCRAPE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _cache_path(job_url).write_text(json.dumps(result), encoding="utf-8")
+    except OSError as e:
+        logger.warning(f"Could not write scrape cache: {e}")
+
+# --- Plain HTTP fetch ---
+# Most postings are server-rendered, so a GET with browser-like headers is
+# usually enough; Chromium is only needed for JS challenges.
+_http = requests.Session()
+_http.headers.update({
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9,fr;q=0.8",
+})
+# Challenge and login-wall pages announce themselves near the top of the document.
+# Only the head is checked: Cloudflare also injects challenge-platform scripts at
+# the end of ordinary pages it fronts.
+_BLOCKED_PAGE_MARKERS = ("Just a moment", "challenge-platform", "cf-browser-verification", "authwall")
+_BLOCKED_PAGE_HEAD = 4096
+
+def _looks_blocked(html: str) -> bool:
+    head = html[:_BLOCKED_PAGE_HEAD]
+    return len(html) < 2048 or any(marker in head for marker in _BLOCKED_PAGE_MARKERS)
+
+def _fetch_html(job_url: str) -> str | None:
+    try:
+        response = _http.get(job_url, timeout=10)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.warning(f"Plain HTTP fetch failed: {e}")
+        return None
+    # requests falls back to ISO-8859-1 for text/html without a charset, which
+    # garbles accented postings; sniff the body instead in that case.
+    if "charset" not in response.headers.get("Content-Type", "").lower():
+        response.encoding = response.apparent_encoding
+    return response.text
+
+# Navigation returns at "commit"; the description container appearing is the real readiness signal
+_READY_TIMEOUT_MS = 8000
+
+def _ready_selector(job_url: str) -> str:
+    return (_resolve_selectors(_hostname(job_url)) or _DEFAULT_SITE).description_container
+
+# Resource types and trackers that never affect the extracted text
+_BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+# Matched against the request's hostname (exact or subdomain), never the path or query
+_BLOCKED_TRACKER_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "hotjar.com",
+    "segment.io",
+    "segment.com",
+    "datadoghq.com",
+    "datadoghq-browser-agent.com",
+)
+
+def _is_tracker_host(hostname: str) -> bool:
+    return any(hostname == host or hostname.endswith("." + host) for host in _BLOCKED_TRACKER_HOSTS)
+
+def _is_blocked(request) -> bool:
+    # The page itself (and its frames) must always load. Subresource URLs are parsed
+    # directly: their unique query strings would just churn the _hostname cache.
+    if request.resource_type == "document":
+        return False
+    return request.resource_type in _BLOCKED_RESOURCE_TYPES or _is_tracker_host(urlparse(request.url).hostname or "")
+
+def _block_heavy_resources(route) -> None:
+    if _is_blocked(route.request):
+        route.abort()
+    else:
+        route.continue_()
+
+async def _block_heavy_resources_async(route) -> None:
+    if _is_blocked(route.request):
+        await route.abort()
+    else:
+        await route.continue_()
+
+# --- Warm browser pool ---
+# Launching Chromium costs ~0.5-1.5s, so browsers stay up and each scrape only gets
+# a fresh context. Sync Playwright objects cannot cross threads, so each browser
+# thread below owns its own pool.
+_LAUNCH_ARGS = [
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--no-zygote",
+    "--disable-extensions",
+    "--disable-gpu",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-sync",
+    "--mute-audio",
+    # Belt and braces with route blocking: never decode images in the renderer
+    "--blink-settings=imagesEnabled=false",
+    "--disable-features=Translate,BackForwardCache,AcceptCHFrame,MediaRouter,OptimizationHints",
+]
+
+class _BrowserPool:
+    """
+    One long-lived Playwright + Chromium, owned by a single browser thread.
+    Callers hand the context they acquire back to `release_context` (the browser
+    stays up): closing the context is what releases the page memory. Chromium's
+    RSS still creeps up over many contexts, so the browser is relaunched every
+    `recycle_after` contexts.
+    """
+
+    def __init__(self, recycle_after: int = 50) -> None:
+        self.recycle_after = recycle_after
+        self._ctx_count = 0
+        self._playwright = sync_playwright().start()
+        self.browser = self._launch()
+
+    def _launch(self) -> Browser:
+        return self._playwright.chromium.launch(headless=True, args=_LAUNCH_ARGS)
+
+    def acquire_context(self) -> BrowserContext:
+        self._ctx_count += 1
+        if self._ctx_count % self.recycle_after == 0 and self.browser.is_connected():
+            logger.info(f"Recycling Chromium after {self._ctx_count} contexts.")
+            self.browser.close()
+        if not self.browser.is_connected():
+            self.browser = self._launch()
+        context = self.browser.new_context()
+        context.route("**/*", _block_heavy_resources)
+        return context
+
+    def release_context(self, context: BrowserContext) -> None:
+        context.close()
+        # Drop the Python-side channel objects the closed context leaves behind
+        gc.collect()
+
+    def close(self) -> None:
+        try:
+            self.browser.close()
+        finally:
+            self._playwright.stop()
+
+# --- Browser threads ---
+# Sync Playwright objects only work on the thread that created them, so each
+# warm browser is owned by one of a fixed set of threads. Scrapes are queued to
+# them, which caps Chromium instances per process no matter how many threads
+# call run_url_scraper, and lets each pool be closed on its own thread.
+BROWSER_THREADS = int(os.getenv("SCRAPER_BROWSER_THREADS", "2"))
+
+_browser_jobs: "queue.Queue[tuple | None]" = queue.Queue()
+_browser_threads: list[threading.Thread] = []
+_browser_threads_lock = threading.Lock()
+
+def _browser_worker() -> None:
+    pool: _BrowserPool | None = None
+    while (job := _browser_jobs.get()) is not None:
+        fn, args, future = job
+        if not future.set_running_or_notify_cancel():
+            continue
+        try:
+            if pool is None:
+                pool = _BrowserPool()
+            future.set_result(fn(pool, *args))
+        except BaseException as e:
+            future.set_exception(e)
+    if pool is not None:
+        try:
+            pool.close()
+        except Exception as e:
+            logger.warning(f"Could not close browser pool: {e}")
+
+def _run_with_browser(fn, *args):
+    """Runs fn(pool, *args) on a browser thread and waits for its result."""
+    with _browser_threads_lock:
+        if not _browser_threads:
+            for i in range(BROWSER_THREADS):
+                thread = threading.Thread(target=_browser_worker, name=f"scraper-browser-{i}", daemon=True)
+                thread.start()
+                _browser_threads.append(thread)
+    future: Future = Future()
+    _browser_jobs.put((fn, args, future))
+    return future.result()
+
+@atexit.register
+def shutdown_browser_threads() -> None:
+    """Closes every warm browser on its owning thread. Safe to call more than once."""
+    with _browser_threads_lock:
+        threads = list(_browser_threads)
+        _browser_threads.clear()
+    for _ in threads:
+        _browser_jobs.put(None)
+    for thread in threads:
+        thread.join(timeout=10)
+
+# --- Apify ---
+APIFY_ACTOR_ID = "h7sQ4K5p2"  # misery/indeed-scraper
+APIFY_MEMORY_MBYTES = 512  # one URL per run; the actor default is sized for bulk crawls
+# Only the fields mapped below are fetched from the dataset
+APIFY_ITEM_FIELDS = ["positionName", "jobTitle", "company", "description", "jobDescription"]
+
 def run_apify_scraper(job_url: str) -> dict | None:
     """
     Uses the Apify 'misery/indeed-scraper' Actor to scrape the job.
@@ -42,11 +301,13 @@ def run_apify_scraper(job_url: str) -> dict | None:
         
         # Run the Actor and wait for it to finish
         # Actor: misery/indeed-scraper (h7sQ4K5p2) - Free/Cheap and reliable
-        run = client.actor("h7sQ4K5p2").call(run_input=run_input)
+        run = client.actor(APIFY_ACTOR_ID).call(run_input=run_input, memory_mbytes=APIFY_MEMORY_MBYTES)
         
         # Fetch results from the dataset
         logger.info(f"Actor run finished. Fetching results from dataset {run['defaultDatasetId']}...")
-        dataset_items = client.dataset(run["defaultDatasetId"]).list_items().items
+        dataset_items = client.dataset(run["defaultDatasetId"]).list_items(
+            fields=APIFY_ITEM_FIELDS, limit=1, clean=True
+        ).items
         
         if not dataset_items:
             logger.warning("Apify Actor returned no items.")
@@ -83,41 +344,51 @@ def run_apify_scraper(job_url: str) -> dict | None:
         logger.error(f"Apify scraper failed: {e}")
         return None
 
+# Elements whose text is code or markup, never readable content
+_NON_TEXT_TAGS = ["script", "style", "noscript", "template"]
+
+def _node_text(node) -> str:
+    """
+    Joins the node's non-empty visible text fragments with newlines, like
+    BeautifulSoup's get_text(separator="\n", strip=True).
+    Drops script/style-like elements from the (per-call) tree first.
+    """
+    node.strip_tags(_NON_TEXT_TAGS)
+    fragments = (n.text(deep=False).strip() for n in node.traverse(include_text=True) if n.tag == "-text")
+    return "\n".join(f for f in fragments if f)
+
 def _extract_from_html(html_content: str, job_url: str) -> dict | None:
     """
     Parses raw HTML (from fallback) to extract job details.
     """
-    soup = BeautifulSoup(html_content, "html.parser")
-    hostname = urlparse(job_url).hostname
-    
-    # Normalize hostname for selector lookup
-    selectors = SITE_SELECTORS.get(hostname)
-    if not selectors:
-        # Try to find a matching key (e.g., 'indeed.com' for 'fr.indeed.com')
-        for site, sel in SITE_SELECTORS.items():
-            if site in hostname:
-                selectors = sel
-                break
+    # A blocked page can never pass validation, so don't pay for the parse
+    if _looks_blocked(html_content):
+        logger.warning(f"Page at {job_url} looks like a challenge or login wall. Skipping parse.")
+        return None
+
+    tree = LexborHTMLParser(html_content)
+    hostname = _hostname(job_url)
+    selectors = _resolve_selectors(hostname)
     
     if not selectors:
         logger.warning(f"No specific selectors found for {hostname}, trying generic fallback.")
         # Generic fallback (could be improved)
-        selectors = SITE_SELECTORS["indeed.com"]
+        selectors = _DEFAULT_SITE
 
     try:
         # 1. Job Title
-        title_tag = soup.select_one(selectors["job_title"])
-        job_title = title_tag.get_text(strip=True) if title_tag else "Unknown Job Title"
+        title_tag = tree.css_first(selectors.job_title)
+        job_title = title_tag.text(strip=True) if title_tag else "Unknown Job Title"
         
         # 2. Company
-        company_tag = soup.select_one(selectors["company"])
-        company = company_tag.get_text(strip=True) if company_tag else "Unknown Company"
+        company_tag = tree.css_first(selectors.company)
+        company = company_tag.text(strip=True) if company_tag else "Unknown Company"
         
         # 3. Description
-        desc_tag = soup.select_one(selectors["description_container"])
+        desc_tag = tree.css_first(selectors.description_container)
         if desc_tag:
             # Get text with newlines for readability
-            job_desc = desc_tag.get_text(separator="\n", strip=True)
+            job_desc = _node_text(desc_tag)
         else:
             job_desc = ""
             
@@ -144,13 +415,28 @@ def _extract_from_html(html_content: str, job_url: str) -> dict | None:
         return None
 
 
-def run_url_scraper(job_url: str) -> dict | None:
+def run_url_scraper(job_url: str, force_refresh: bool = False) -> dict | None:
     """
     Scrapes a job posting URL.
-    Prioritizes Apify if configured, otherwise falls back to local Playwright.
+    Serves a cached result from the last 24h unless `force_refresh` is set.
+    Otherwise prioritizes Apify if configured, then a plain HTTP fetch, and only
+    launches local Playwright when the page needs a real browser.
     """
     logger.info(f"--- Starting Scraper Agent for URL: {job_url} ---")
-    
+
+    if not force_refresh:
+        cached = _load_cached(job_url)
+        if cached:
+            logger.info("Using cached scrape result.")
+            return cached
+
+    result = _scrape(job_url)
+    if result:
+        _store_cached(job_url, result)
+    return result
+
+
+def _scrape(job_url: str) -> dict | None:
     # 1. Try Apify
     if os.getenv("APIFY_API_TOKEN"):
         logger.info("APIFY_API_TOKEN found. Using Apify.")
@@ -158,35 +444,98 @@ def run_url_scraper(job_url: str) -> dict | None:
         if result:
             return result
         else:
-            logger.warning("Apify failed. Falling back to local Playwright...")
+            logger.warning("Apify failed. Falling back to local scraping...")
     else:
-        logger.info("No APIFY_API_TOKEN found. Using local Playwright.")
+        logger.info("No APIFY_API_TOKEN found. Using local scraping.")
 
-    # 2. Local Playwright Fallback
-    try:
-        hostname = urlparse(job_url).hostname
-        
-        if not hostname: 
-            return None
+    if not _hostname(job_url):
+        return None
 
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            
-            logger.info(f"Navigating to {job_url} (Local)...")
-            page.goto(job_url, wait_until="domcontentloaded", timeout=30000)
-            
-            # Basic Cloudflare check
-            if "Just a moment" in page.title():
-                logger.error("Cloudflare challenge detected locally. Apify is recommended.")
-                browser.close()
-                return None
-                
-            content = page.content()
-            browser.close()
-            
-            return _extract_from_html(content, job_url)
+    # 2. Plain HTTP
+    html = _fetch_html(job_url)
+    if html and not _looks_blocked(html):
+        result = _extract_from_html(html, job_url)
+        if result:
+            return result
+    logger.info("Plain HTTP fetch was not enough. Falling back to local Playwright...")
 
+    # 3. Local Playwright Fallback
+    try:
+        return _run_with_browser(_scrape_with_browser, job_url)
     except Exception as e:
         logger.error(f"Local Playwright scraper failed: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def _scrape_with_browser(pool: _BrowserPool, job_url: str) -> dict | None:
+    # Runs on a browser thread (see _run_with_browser)
+    context = pool.acquire_context()
+    try:
+        page = context.new_page()
+
+        logger.info(f"Navigating to {job_url} (Local)...")
+        page.goto(job_url, wait_until="commit", timeout=20000)
+        try:
+            page.locator(_ready_selector(job_url)).first.wait_for(state="attached", timeout=_READY_TIMEOUT_MS)
+            # "attached" fires at the opening tag, while its children may still be streaming in.
+            # With subresources blocked, DOMContentLoaded follows shortly and means parsing is done.
+            page.wait_for_load_state("domcontentloaded", timeout=_READY_TIMEOUT_MS)
+        except PlaywrightTimeoutError:
+            # Challenge pages never render it; the checks below handle that case
+            logger.warning("Job description did not appear in time. Parsing what has loaded.")
+
+        # One CDP round-trip for both the title check and the HTML
+        title, content = page.evaluate("() => [document.title, document.documentElement.outerHTML]")
+
+        # Basic Cloudflare check
+        if "Just a moment" in title:
+            logger.error("Cloudflare challenge detected locally. Apify is recommended.")
+            return None
+    finally:
+        pool.release_context(context)
+
+    return _extract_from_html(content, job_url)
+
+
+# --- Batch scraping ---
+async def _scrape_one_async(browser: AsyncBrowser, job_url: str, sem: asyncio.Semaphore) -> dict | None:
+    async with sem:
+        context = await browser.new_context()
+        try:
+            await context.route("**/*", _block_heavy_resources_async)
+            page = await context.new_page()
+            await page.goto(job_url, wait_until="commit", timeout=20000)
+            try:
+                await page.locator(_ready_selector(job_url)).first.wait_for(state="attached", timeout=_READY_TIMEOUT_MS)
+                # Wait for parsing to finish so the container's children are all there
+                await page.wait_for_load_state("domcontentloaded", timeout=_READY_TIMEOUT_MS)
+            except PlaywrightTimeoutError:
+                logger.warning(f"Job description did not appear in time for {job_url}. Parsing what has loaded.")
+            title, content = await page.evaluate("() => [document.title, document.documentElement.outerHTML]")
+        except Exception as e:
+            logger.error(f"Batch scrape failed for {job_url}: {e}")
+            return None
+        finally:
+            # Closing the context is what releases the page's memory
+            await context.close()
+
+    if "Just a moment" in title:
+        logger.error(f"Cloudflare challenge detected for {job_url}.")
+        return None
+    return _extract_from_html(content, job_url)
+
+
+async def run_url_scraper_many(job_urls: list[str], concurrency: int = 8) -> list[dict | None]:
+    """
+    Scrapes several job URLs concurrently with one async Chromium.
+    At most `concurrency` pages are open at once; results keep the order of
+    `job_urls`, with None for URLs that failed.
+    """
+    logger.info(f"--- Starting batch Scraper Agent for {len(job_urls)} URLs ---")
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True, args=_LAUNCH_ARGS)
+        try:
+            sem = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(_scrape_one_async(browser, url, sem) for url in job_urls))
+        finally:
+            await browser.close()
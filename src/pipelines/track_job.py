@@ -1,6 +1,13 @@
+from functools import lru_cache
+from typing import Optional
 from loguru import logger
 from src.tools.notion_client import NotionTool
 
+@lru_cache(maxsize=1)
+def _notion() -> NotionTool:
+    # One client for the process: its HTTP connection pool keeps api.notion.com warm.
+    return NotionTool()
+
 def run_job_tracker(
     job_title: str,
     company: str,
@@ -8,15 +15,16 @@ def run_job_tracker(
     status: str,  # <-- NEW PARAMETER
     fit_score: float,
     reason: str,
-    cover_letter_text: str,
+    cover_letter_text: Optional[str] = None,
 ) -> str:
     """
     The Tracker Agent's main pipeline.
     Uses the NotionTool to create a comprehensive record in the Notion database.
+    Without `cover_letter_text` only the page is created; see `attach_cover_letter`.
     """
     logger.info(f"--- Starting Tracker Agent for: {job_title} ---")
     try:
-        notion_tool = NotionTool()
+        notion_tool = _notion()
         page_id = notion_tool.create_job_page(
             job_title=job_title,
             company=company,
@@ -26,7 +34,7 @@ def run_job_tracker(
             reason=reason,
         )
 
-        if page_id and cover_letter_text != "N/A - Job fit score was too low.":
+        if page_id and cover_letter_text:
             notion_tool.add_cover_letter_to_page(
                 page_id=page_id,
                 cover_letter_text=cover_letter_text,
@@ -38,4 +46,17 @@ def run_job_tracker(
     except Exception as e:
         logger.error(f"An error occurred in the Tracker Agent pipeline: {e}")
         return None
-    
\ No newline at end of file
+
+def attach_cover_letter(page_id: str, cover_letter_text: str) -> None:
+    """Appends a cover letter to a page created earlier by `run_job_tracker`."""
+    try:
+        _notion().add_cover_letter_to_page(page_id=page_id, cover_letter_text=cover_letter_text)
+    except Exception as e:
+        logger.error(f"An error occurred while attaching the cover letter: {e}")
+
+def discard_job_page(page_id: str) -> None:
+    """Archives a page created by `run_job_tracker` whose letter step then failed."""
+    try:
+        _notion().archive_page(page_id)
+    except Exception as e:
+        logger.error(f"An error occurred while discarding the Notion page: {e}")
@@ -1,30 +1,72 @@
 from __future__ import annotations
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, List, Optional
 from loguru import logger
 
-from src.agents.memory import Memory
-from src.llm import LLM, truncate_by_tokens
+from src.agents.registry import get_llm, get_memory
+from src.llm import estimate_tokens, render_template, truncate_by_tokens
 
 # Conservative token budgets for free tiers
 MAX_RESUME_TOKENS = 1200
 MAX_JOBDESC_TOKENS = 1200
 
+# This is still a stub, we can make this an agent later
+_BULLETS_BYTES = "\n".join([
+    "- Built AI-driven automations and pipelines.",
+    "- Experienced with Next.js, TypeScript, and FastAPI.",
+    "- Multilingual: English, Portuguese, Spanish; learning French.",
+]).encode("utf-8")
 
+
+# Characters that can't appear in the per-job output directory name
+_UNSAFE_PATH_CHARS = str.maketrans({" ": "_", "/": "_"})
+
+# Shared by all calls; the retrieval side-work is small and I/O-bound.
+_io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="write-letter")
+
+
+@lru_cache(maxsize=1)
 def _load_prompt_template() -> str:
+    # The template only changes on deploy, so read it once per process.
     tmpl_path = Path("src/prompts/tasks/tailor_cover.md")
     return tmpl_path.read_text(encoding="utf-8")
 
 
+def _write_bytes(path: Path, data: bytes) -> None:
+    # One-shot artifacts: a raw fd skips the buffered TextIOWrapper layer entirely.
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def _stream_to_file(chunks: Iterable[str], path: Path) -> str:
+    """Writes chunks to `path` as they arrive and returns the full text."""
+    parts: List[str] = []
+    with path.open("w", encoding="utf-8", buffering=1 << 16) as fh:
+        for chunk in chunks:
+            fh.write(chunk)
+            parts.append(chunk)
+    return "".join(parts)
+
+
 def _render_prompt(
     tmpl: str, *, job_title: str, job_desc: str, resume_text: str, brand_voice: str
 ) -> str:
-    # Simple string replacement (could later swap to jinja2)
-    return (
-        tmpl.replace("{{job_title}}", job_title)
-        .replace("{{job_desc}}", job_desc)
-        .replace("{{resume_text}}", resume_text)
-        .replace("{{brand_voice}}", brand_voice)
+    return render_template(
+        tmpl,
+        {
+            "job_title": job_title,
+            "job_desc": job_desc,
+            "resume_text": resume_text,
+            "brand_voice": brand_voice,
+        },
     )
 
 
@@ -39,18 +81,34 @@ def run_write_letter(
     It queries the 'resume_chunks' memory to find the most relevant
     parts of the resume for a given job description.
     """
-    # --- MEMORY RETRIEVAL ---
-    profile_mem = Memory("profile")
-    resume_mem = Memory("resume_chunks") # Connect to our new smart memory
+    # Token safety: truncate before the job description is embedded as a query, too
+    job_desc = truncate_by_tokens(job_desc, MAX_JOBDESC_TOKENS)
 
-    # Resolve brand voice from memory if missing
-    if not brand_voice:
-        brand_voice = profile_mem.get("brand_voice") or "Concise, optimistic, systems-builder tone."
+    # --- MEMORY RETRIEVAL ---
+    profile_mem = get_memory("profile")
+    resume_mem = get_memory("resume_chunks") # Connect to our new smart memory
 
     # --- THIS IS THE KEY UPGRADE ---
     logger.info("Searching for relevant resume chunks based on job description...")
-    # The job description is now a search query!
-    relevant_chunks = resume_mem.similar(query=job_desc, k=3) 
+    # The job description is now a search query! The search is the long pole, so the
+    # independent brand voice lookup, template load and out dir creation run alongside it.
+    chunks_future = _io_pool.submit(resume_mem.similar, query=job_desc, k=3)
+    voice_future = None if brand_voice else _io_pool.submit(profile_mem.get, "brand_voice")
+    tmpl_future = _io_pool.submit(_load_prompt_template)
+
+    safe_job_title = job_title.translate(_UNSAFE_PATH_CHARS)
+    out_dir = Path("out") / safe_job_title
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # The bullets are static, so their file is written while the LLM call runs
+    bullets_path = out_dir / "resume_bullets.md"
+    bullets_future = _io_pool.submit(_write_bytes, bullets_path, _BULLETS_BYTES)
+
+    # Resolve brand voice from memory if missing
+    if voice_future:
+        brand_voice = voice_future.result() or "Concise, optimistic, systems-builder tone."
+
+    relevant_chunks = chunks_future.result()
     
     # We join the results into a single string for the prompt
     contextual_resume = "\n---\n".join([chunk[0] for chunk in relevant_chunks])
@@ -62,10 +120,9 @@ def run_write_letter(
 
     # Token safety: truncate big inputs for free tiers
     final_resume_text = truncate_by_tokens(final_resume_text, MAX_RESUME_TOKENS)
-    job_desc = truncate_by_tokens(job_desc, MAX_JOBDESC_TOKENS)
 
     # Build prompt
-    tmpl = _load_prompt_template()
+    tmpl = tmpl_future.result()
     prompt = _render_prompt(
         tmpl,
         job_title=job_title,
@@ -74,36 +131,27 @@ def run_write_letter(
         brand_voice=brand_voice,
     )
 
-    # Call LLM
-    llm = LLM()
-    cover_letter = llm.generate(prompt)
+    # Call LLM, writing the letter to disk as it streams in
+    llm = get_llm()
+    cover_path = out_dir / "cover_letter.md"
+    cover_letter = _stream_to_file(llm.stream(prompt), cover_path)
 
-    # Guardrail: ensure minimal length; retry once if too short
+    # Guardrail: ensure minimal length; if too short, expand the draft once
+    # (passing it back as context instead of regenerating from scratch)
     if len(cover_letter.strip()) < 400:
-        logger.warning("Initial cover letter was too short, retrying with corrective prompt...")
+        logger.warning("Initial cover letter was too short, expanding it with a corrective prompt...")
         corrective = (
             "\n\n[System note: Your previous response was too short. "
-            "Rewrite to ~300 words, keep it factual, include 3 bullet highlights, "
-            "and maintain the given brand voice.]"
+            "Expand the draft below to ~300 words, keep it factual, include 3 bullet highlights, "
+            "and maintain the given brand voice. Return the complete letter.]\n\n"
+            + cover_letter
         )
-        cover_letter = llm.generate(prompt + corrective)
-
-    # Write artifacts
-    safe_job_title = job_title.replace(" ", "_").replace("/", "_")
-    out_dir = Path("out") / safe_job_title
-    out_dir.mkdir(parents=True, exist_ok=True)
+        # LLM.stream truncates from the end, which would cut the note and draft first.
+        # Trim the base prompt instead, leaving a few tokens for the truncation marker.
+        base_budget = llm.max_prompt_tokens - estimate_tokens(corrective) - 8
+        _stream_to_file(llm.stream(truncate_by_tokens(prompt, base_budget) + corrective), cover_path)
 
-    cover_path = out_dir / "cover_letter.md"
-    cover_path.write_text(cover_letter, encoding="utf-8")
-
-    bullets_path = out_dir / "resume_bullets.md"
-    # This is still a stub, we can make this an agent later
-    bullets = [
-        "- Built AI-driven automations and pipelines.",
-        "- Experienced with Next.js, TypeScript, and FastAPI.",
-        "- Multilingual: English, Portuguese, Spanish; learning French.",
-    ]
-    bullets_path.write_text("\n".join(bullets), encoding="utf-8")
+    bullets_future.result()
 
     logger.info(f"Tailor v2 finished for {job_title}")
 
@@ -1,88 +1,111 @@
-from dotenv import load_dotenv
-load_dotenv()
-
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional
+import os
+
+# Deployments that inject the environment themselves set APP_ENV_LOADED and skip
+# the .env read. main.py loads .env once before starting workers and sets it too;
+# this fallback covers running the app directly (e.g. `uvicorn src.server.api:app`).
+if not os.getenv("APP_ENV_LOADED"):
+    from dotenv import load_dotenv
+    load_dotenv()
+    os.environ["APP_ENV_LOADED"] = "1"
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Response
+from pydantic import BaseModel, ConfigDict
+from typing import Any, Dict, Optional
 from pathlib import Path
 from loguru import logger
-import xxhash
-from pypdf import PdfReader
 
 from src.pipelines.write_letter import run_write_letter
 from src.pipelines.rank_job import run_job_ranker
-from src.pipelines.track_job import run_job_tracker
-from src.pipelines.scrape_job_url import run_url_scraper
-from src.agents.memory import Memory
+from src.pipelines.track_job import attach_cover_letter, discard_job_page, run_job_tracker
+from src.pipelines.scrape_job_url import run_url_scraper, shutdown_browser_threads
+from src.pipelines.index_resume import resume_fingerprint, run_resume_indexer
+from src.agents.registry import get_memory
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Warm browsers must be closed on the threads that own them
+    await asyncio.to_thread(shutdown_browser_threads)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # --- Configuration ---
 RESUME_PDF_PATH = "GabrielDalmoro_Resume_Software_2025.pdf"
-CHUNK_SIZE = 800
-CHUNK_OVERLAP = 100
 RANKING_THRESHOLD = 7.0
 
+# -------------------- Response Models --------------------
+# Declared on every route so FastAPI serializes responses through Pydantic's
+# Rust core in one step instead of the generic jsonable_encoder + json.dumps path.
+class OkResponse(BaseModel):
+    ok: bool
+
+class StatusResponse(OkResponse):
+    message: str
+
+class JobProcessResponse(BaseModel):
+    status: str
+    ranking: Dict[str, Any]
+    message: str
+    notion_page_id: Optional[str] = None
+    cover_letter_path: Optional[str] = None
+
 # -------------------- Health --------------------
-@app.get("/health")
+@app.get("/health", response_model=StatusResponse)
 def health():
     return {"ok": True, "message": "AI-ops environment is alive!"}
 
 # -------------------- Memory Models & Endpoints --------------------
-class BrandVoiceUpsert(BaseModel):
+class _RequestModel(BaseModel):
+    # Request bodies are read-only (unknown fields are already ignored by default)
+    model_config = ConfigDict(frozen=True)
+
+class BrandVoiceUpsert(_RequestModel):
     brand_voice: str
 
-@app.post("/memory/brand-voice")
+@app.post("/memory/brand-voice", response_model=OkResponse)
 def save_brand_voice(req: BrandVoiceUpsert):
-    mem = Memory("profile")
+    mem = get_memory("profile")
     mem.upsert("brand_voice", req.brand_voice, {"type": "brand_voice"})
     return {"ok": True}
 
-@app.post("/memory/resume/index")
-def index_resume():
+@app.post("/memory/resume/index", response_model=StatusResponse)
+async def index_resume(response: Response):
     pdf_path = Path(RESUME_PDF_PATH)
     if not pdf_path.exists():
         raise HTTPException(status_code=404, detail=f"Resume PDF not found at {RESUME_PDF_PATH}")
-    
-    current_fingerprint = xxhash.xxh64(pdf_path.read_bytes()).hexdigest()
-    profile_mem = Memory("profile")
-    saved_fingerprint = profile_mem.get_resume_fingerprint()
-
-    if current_fingerprint == saved_fingerprint:
-        return {"ok": True, "message": "Resume memory is already up-to-date."}
-    
-    logger.info("New resume version detected. Starting indexing process...")
-    reader = PdfReader(pdf_path)
-    resume_text = "".join(page.extract_text() or "" for page in reader.pages)
-    chunks = [resume_text[i:i + CHUNK_SIZE] for i in range(0, len(resume_text), CHUNK_SIZE - CHUNK_OVERLAP)]
 
-    resume_mem = Memory("resume_chunks")
-    doc_ids = [f"resume_chunk_{i}" for i in range(len(chunks))]
-    resume_mem.col.upsert(ids=doc_ids, documents=chunks)
-    profile_mem.set_resume_fingerprint(current_fingerprint)
+    result = await asyncio.to_thread(run_resume_indexer, pdf_path)
 
-    logger.success(f"Successfully indexed {len(chunks)} chunks and saved new fingerprint.")
-    return {"ok": True, "message": f"Successfully indexed new resume with {len(chunks)} chunks."}
+    # The memory now reflects this exact file, so its fingerprint doubles as the ETag.
+    # This is a POST (it may have just re-indexed), so the body is always sent; the
+    # tag only lets clients tell whether the indexed resume changed since last time.
+    response.headers["ETag"] = f'"{await asyncio.to_thread(resume_fingerprint, pdf_path)}"'
+    return result
 
 # -------------------- Main Orchestrator Endpoints -------------------
-class JobProcessRequest(BaseModel):
+class JobProcessRequest(_RequestModel):
     job_title: str
     company: str
     job_desc: str
     job_url: str = ""
 
 # --- NEW: The URL-based endpoint ---
-class URLProcessRequest(BaseModel):
+class URLProcessRequest(_RequestModel):
     job_url: str
+    force_refresh: bool = False
 
-@app.post("/process-job-from-url")
-def process_job_from_url(req: URLProcessRequest):
+# exclude_unset keeps the skipped response free of the processed-only fields
+@app.post("/process-job-from-url", response_model=JobProcessResponse, response_model_exclude_unset=True)
+async def process_job_from_url(req: URLProcessRequest, background_tasks: BackgroundTasks):
     """
     The new top-level orchestrator. Takes a URL, scrapes it,
     then passes the data to the main processing logic.
     """
     # Step 1: Delegate to the Scraper Agent
-    scraped_data = run_url_scraper(req.job_url)
+    scraped_data = await asyncio.to_thread(run_url_scraper, req.job_url, force_refresh=req.force_refresh)
     
     # --- VALIDATION ---
     if not scraped_data or not scraped_data.get("job_desc"):
@@ -92,191 +115,96 @@ def process_job_from_url(req: URLProcessRequest):
             detail="Failed to extract valid job details. The URL might be a search page or blocked."
         )
     
-    # Step 2: Call the existing job processing logic with the scraped data
-    return process_job_application(JobProcessRequest(**scraped_data))
+    # Step 2: Call the existing job processing logic with the scraped data.
+    # The scraper's output is ours, so it skips a second round of model validation.
+    return await _process_job(
+        job_title=scraped_data["job_title"],
+        company=scraped_data["company"],
+        job_desc=scraped_data["job_desc"],
+        job_url=scraped_data.get("job_url", req.job_url),
+        background_tasks=background_tasks,
+    )
+
+
+@app.post("/process-job", response_model=JobProcessResponse, response_model_exclude_unset=True)
+async def process_job_application(req: JobProcessRequest, background_tasks: BackgroundTasks):
+    return await _process_job(
+        job_title=req.job_title,
+        company=req.company,
+        job_desc=req.job_desc,
+        job_url=req.job_url,
+        background_tasks=background_tasks,
+    )
 
 
-@app.post("/process-job")
-def process_job_application(req: JobProcessRequest):
+async def _process_job(
+    job_title: str, company: str, job_desc: str, job_url: str, background_tasks: BackgroundTasks
+) -> dict:
     """
     This is the main orchestrator. It chains the Ranker, Tailor, and Tracker agents.
+    The agents block on network I/O, so each runs in a worker thread and the event
+    loop stays free for other requests in the meantime. Notion writes whose result
+    the caller doesn't need run as background tasks after the response is sent.
     """
-    logger.info(f"--- Starting Orchestrated Job Process for: {req.job_title} ---")
+    logger.info(f"--- Starting Orchestrated Job Process for: {job_title} ---")
     
-    ranking_result = run_job_ranker(job_title=req.job_title, job_desc=req.job_desc)
+    ranking_result = await asyncio.to_thread(run_job_ranker, job_title=job_title, job_desc=job_desc)
     fit_score = ranking_result.get("fit_score", 0.0)
 
     if fit_score < RANKING_THRESHOLD:
         logger.warning(f"Job ranked {fit_score}, below threshold. Halting and logging as 'Skipped'.")
-        run_job_tracker(
-            job_title=req.job_title,
-            company=req.company,
-            job_url=req.job_url,
+        background_tasks.add_task(
+            run_job_tracker,
+            job_title=job_title,
+            company=company,
+            job_url=job_url,
             status="Skipped",
             fit_score=fit_score,
             reason=ranking_result.get("reason", ""),
-            cover_letter_text="N/A - Job fit score was too low."
         )
         return {"status": "skipped", "ranking": ranking_result, "message": "Job fit too low. Logged to Notion as 'Skipped'."}
     
     logger.success(f"Job ranked {fit_score}, proceeding to write letter.")
 
-    application_result = run_write_letter(job_title=req.job_title, job_desc=req.job_desc)
+    # The Notion page doesn't depend on the letter, so it is created while the letter
+    # is written; the letter is appended to it afterwards. If the letter fails, the
+    # page is archived so Notion never shows a "Written Letter" record without one.
+    application_result, notion_page_id = await asyncio.gather(
+        asyncio.to_thread(run_write_letter, job_title=job_title, job_desc=job_desc),
+        asyncio.to_thread(
+            run_job_tracker,
+            job_title=job_title,
+            company=company,
+            job_url=job_url,
+            status="Written Letter",
+            fit_score=fit_score,
+            reason=ranking_result.get("reason", ""),
+        ),
+        return_exceptions=True,
+    )
+    if isinstance(notion_page_id, BaseException):
+        logger.error(f"Notion page creation failed: {notion_page_id}")
+        notion_page_id = None
+    if isinstance(application_result, BaseException):
+        if notion_page_id:
+            await asyncio.to_thread(discard_job_page, notion_page_id)
+        raise application_result
     
     cover_letter_path_str = application_result.get("artifacts", {}).get("cover_letter_path")
     cover_letter_text = "Error: Could not read cover letter file."
     if cover_letter_path_str:
         try:
-            cover_letter_text = Path(cover_letter_path_str).read_text()
+            cover_letter_text = await asyncio.to_thread(Path(cover_letter_path_str).read_text, encoding="utf-8")
         except Exception as e:
             logger.error(f"Failed to read cover letter file: {e}")
 
-    notion_page_id = run_job_tracker(
-        job_title=req.job_title,
-        company=req.company,
-        job_url=req.job_url,
-        status="Written Letter",
-        fit_score=fit_score,
-        reason=ranking_result.get("reason", ""),
-        cover_letter_text=cover_letter_text
-    )
+    if notion_page_id:
+        background_tasks.add_task(attach_cover_letter, notion_page_id, cover_letter_text)
 
     return {
         "status": "processed",
         "ranking": ranking_result,
         "notion_page_id": notion_page_id,
+        "cover_letter_path": cover_letter_path_str,
         "message": "Job processed successfully and logged to Notion as 'Written Letter'."
     }
-
-# from dotenv import load_dotenv
-# load_dotenv()
-
-# from fastapi import FastAPI, HTTPException
-# from pydantic import BaseModel
-# from typing import Optional
-# from pathlib import Path
-# from loguru import logger
-# import xxhash
-# from pypdf import PdfReader
-
-# # --- Import all three pipelines ---
-# from src.pipelines.write_letter import run_write_letter
-# from src.pipelines.rank_job import run_job_ranker
-# from src.pipelines.track_job import run_job_tracker # <-- IMPORT THE NEW TRACKER
-# from src.agents.memory import Memory
-
-# app = FastAPI()
-
-# # --- Configuration ---
-# RESUME_PDF_PATH = "GabrielDalmoro_Resume_Software_2025.pdf"
-# CHUNK_SIZE = 800
-# CHUNK_OVERLAP = 100
-# RANKING_THRESHOLD = 7.0
-
-# # -------------------- Health --------------------
-# @app.get("/health")
-# def health():
-#     return {"ok": True, "message": "AI-ops environment is alive!"}
-
-# # -------------------- Memory Models & Endpoints --------------------
-# class BrandVoiceUpsert(BaseModel):
-#     brand_voice: str
-
-# @app.post("/memory/brand-voice")
-# def save_brand_voice(req: BrandVoiceUpsert):
-#     mem = Memory("profile")
-#     mem.upsert("brand_voice", req.brand_voice, {"type": "brand_voice"})
-#     return {"ok": True}
-
-# @app.post("/memory/resume/index")
-# def index_resume():
-#     pdf_path = Path(RESUME_PDF_PATH)
-#     if not pdf_path.exists():
-#         raise HTTPException(status_code=404, detail=f"Resume PDF not found at {RESUME_PDF_PATH}")
-
-#     current_fingerprint = xxhash.xxh64(pdf_path.read_bytes()).hexdigest()
-#     profile_mem = Memory("profile")
-#     saved_fingerprint = profile_mem.get_resume_fingerprint()
-
-#     if current_fingerprint == saved_fingerprint:
-#         return {"ok": True, "message": "Resume memory is already up-to-date."}
-
-#     logger.info("New resume version detected. Starting indexing process...")
-#     reader = PdfReader(pdf_path)
-#     resume_text = "".join(page.extract_text() or "" for page in reader.pages)
-#     chunks = [resume_text[i:i + CHUNK_SIZE] for i in range(0, len(resume_text), CHUNK_SIZE - CHUNK_OVERLAP)]
-    
-#     resume_mem = Memory("resume_chunks")
-#     doc_ids = [f"resume_chunk_{i}" for i in range(len(chunks))]
-#     resume_mem.col.upsert(ids=doc_ids, documents=chunks)
-#     profile_mem.set_resume_fingerprint(current_fingerprint)
-
-#     logger.success(f"Successfully indexed {len(chunks)} chunks and saved new fingerprint.")
-#     return {"ok": True, "message": f"Successfully indexed new resume with {len(chunks)} chunks."}
-
-
-# # -------------------- Orchestrator Endpoint --------------------
-# class JobProcessRequest(BaseModel):
-#     job_title: str
-#     company: str 
-#     job_desc: str
-#     job_url: str = "" 
-
-# @app.post("/process-job")
-# def process_job_application(req: JobProcessRequest):
-#     """
-#     This is the main orchestrator. It chains the Ranker, Tailor, and Tracker agents.
-#     """
-#     logger.info(f"--- Starting Orchestrated Job Process for: {req.job_title} ---")
-    
-#     # Step 1: Delegate to the Ranker Agent
-#     ranking_result = run_job_ranker(job_title=req.job_title, job_desc=req.job_desc)
-#     fit_score = ranking_result.get("fit_score", 0.0)
-
-#     # Step 2: Make a Decision
-#     if fit_score < RANKING_THRESHOLD:
-#         logger.warning(f"Job ranked {fit_score}, which is below the threshold. Halting process.")
-#         # Even if we halt, we can still track the lead as "Skipped"
-#         run_job_tracker(
-#             job_title=req.job_title,
-#             company=req.company,
-#             job_url=req.job_url,
-#             status="Skipped",
-#             fit_score=fit_score,
-#             reason=ranking_result.get("reason", ""),
-#             cover_letter_text="N/A - Job fit score was too low."
-#         )
-#         return {"status": "skipped", "ranking": ranking_result, "message": "Job fit too low. Logged to Notion as 'Skipped'."}
-    
-#     logger.success(f"Job ranked {fit_score}, proceeding to tailor application.")
-
-#     # Step 3: Delegate to the Tailor Agent
-#     # We need to read the generated cover letter from the file to pass it to the tracker
-#     application_result = run_write_letter(job_title=req.job_title, job_desc=req.job_desc)
-#     cover_letter_path_str = application_result.get("artifacts", {}).get("cover_letter_path")
-    
-#     cover_letter_text = "Error: Could not read cover letter file."
-#     if cover_letter_path_str:
-#         try:
-#             cover_letter_text = Path(cover_letter_path_str).read_text()
-#         except Exception as e:
-#             logger.error(f"Failed to read cover letter file at {cover_letter_path_str}: {e}")
-
-#     # Step 4: Delegate to the Tracker Agent
-#     notion_page_id = run_job_tracker(
-#         job_title=req.job_title,
-#         company=req.company,
-#         job_url=req.job_url,
-#         status="Written Letter",
-#         fit_score=fit_score,
-#         reason=ranking_result.get("reason", ""),
-#         cover_letter_text=cover_letter_text
-#     )
-
-#     # Step 5: Return a full report
-#     return {
-#         "status": "processed",
-#         "ranking": ranking_result,
-#         "notion_page_id": notion_page_id,
-#         "message": "Job processed successfully and logged to Notion."
-#     }
@@ -2,6 +2,11 @@ import os
 from notion_client import Client
 from loguru import logger
 from typing import List
+import re
+
+# Notion API limit on children per blocks.children.append call
+NOTION_MAX_CHILDREN = 100
+_PARAGRAPH_BREAK_RE = re.compile(r"\n\s*\n")
 
 class NotionTool:
     """
@@ -51,14 +56,23 @@ class NotionTool:
             logger.error(f"Failed to create Notion page: {e}")
             return None
 
+    def archive_page(self, page_id: str) -> None:
+        """Archives (soft-deletes) a page, e.g. one whose application step failed."""
+        try:
+            self.client.pages.update(page_id=page_id, archived=True)
+            logger.info(f"Archived Notion page ID: {page_id}")
+        except Exception as e:
+            logger.error(f"Failed to archive Notion page: {e}")
+
     def add_cover_letter_to_page(self, page_id: str, cover_letter_text: str):
         """Appends the cover letter text to the body of a Notion page."""
         if not page_id:
             return
 
         # Split the cover letter into paragraphs for better formatting in Notion
-        paragraphs = cover_letter_text.strip().split('\n\n')
-        
+        # (any run of blank lines, including whitespace-only ones, separates paragraphs)
+        paragraphs = _PARAGRAPH_BREAK_RE.split(cover_letter_text.strip())
+
         children_blocks: List[dict] = [
             # Add a heading first
             {
@@ -67,20 +81,23 @@ class NotionTool:
                     "rich_text": [{"type": "text", "text": {"content": "Generated Cover Letter"}}]
                 }
             }
-        ]
-        
-        # Add each paragraph as a separate block
-        for p in paragraphs:
-            children_blocks.append({
+        ] + [
+            # Add each paragraph as a separate block
+            {
                 "type": "paragraph",
                 "paragraph": {
                     "rich_text": [{"type": "text", "text": {"content": p}}]
                 }
-            })
+            }
+            for p in paragraphs if p
+        ]
 
         try:
-            self.client.blocks.children.append(block_id=page_id, children=children_blocks)
+            # Notion caps an append at 100 children; batches go in order so the letter reads top-down
+            for start in range(0, len(children_blocks), NOTION_MAX_CHILDREN):
+                self.client.blocks.children.append(
+                    block_id=page_id, children=children_blocks[start:start + NOTION_MAX_CHILDREN]
+                )
             logger.success(f"Successfully added cover letter to Notion page ID: {page_id}")
         except Exception as e:
             logger.error(f"Failed to add content to Notion page: {e}")
-